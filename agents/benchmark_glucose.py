@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the glucose forecasting engine.
+
+Compares scoring a synthetic device backfill one reading at a time against the
+single vectorized bulk pass, and checks that both produce the same forecasts.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from glucose_forecast import GlucoseForecastEngine
+
+
+def make_backfill(num_users, readings_per_user, seed=42):
+    """Synthetic 5-minute CGM traces (random walk around 140 mg/dL), interleaved by time."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 4, size=(num_users, readings_per_user))
+    values = np.clip(140 + np.cumsum(steps, axis=1), 40, 400).round()
+    start = time.time() - readings_per_user * 300
+    times = start + np.arange(readings_per_user) * 300.0
+    user_ids = np.array([str(1001 + u) for u in range(num_users)], dtype=object)
+
+    # Flatten in timestamp order, as a device sync would deliver it
+    return (
+        np.tile(user_ids, readings_per_user),
+        values.T.ravel(),
+        np.repeat(times, num_users),
+    )
+
+
+def run_benchmark(num_users, readings_per_user):
+    user_ids, values, timestamps = make_backfill(num_users, readings_per_user)
+    total = len(values)
+    print(f"📊 Backfill: {num_users} users x {readings_per_user} readings = {total} readings")
+
+    sequential = GlucoseForecastEngine()
+    started = time.perf_counter()
+    seq_predicted = np.array([
+        sequential.add_reading(u, v, t).predicted_value
+        for u, v, t in zip(user_ids, values, timestamps)
+    ])
+    seq_elapsed = time.perf_counter() - started
+
+    bulk = GlucoseForecastEngine()
+    started = time.perf_counter()
+    result = bulk.add_readings(user_ids, values, timestamps)
+    bulk_elapsed = time.perf_counter() - started
+
+    max_diff = float(np.max(np.abs(result.predicted_values - seq_predicted)))
+    print(f"   One-by-one : {seq_elapsed * 1000:9.1f} ms  ({total / seq_elapsed:12,.0f} readings/s)")
+    print(f"   Vectorized : {bulk_elapsed * 1000:9.1f} ms  ({total / bulk_elapsed:12,.0f} readings/s)")
+    print(f"   Speedup    : {seq_elapsed / bulk_elapsed:9.1f}x")
+    print(f"   Alerts     : {len(result.alerts())} readings, {len(result.latest_alerts())} users")
+    print(f"   Max forecast difference vs one-by-one: {max_diff:.6f} mg/dL")
+    return max_diff < 1e-6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--readings", type=int, default=288, help="readings per user (288 = one day)")
+    args = parser.parse_args()
+
+    if run_benchmark(args.users, args.readings):
+        print("✅ Bulk and one-by-one forecasts match")
+    else:
+        print("❌ Bulk and one-by-one forecasts differ")
+        sys.exit(1)
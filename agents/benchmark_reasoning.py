@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the per-agent output policies (no Groq calls).
+
+A stub qwen3 model streams a canned <think> block followed by the answer for
+each agent. The baseline lets every agent think with no output cap and sends
+everything to the client; the policy run applies AGENT_OUTPUT_POLICIES and
+ReasoningFilter. Latency is simulated from the generated token count.
+"""
+
+import argparse
+import random
+
+from output_policy import (
+    AGENT_OUTPUT_POLICIES, OutputPolicy, ReasoningFilter, TokenUsageTracker, strip_reasoning,
+)
+
+# Typical (reasoning tokens, answer tokens) per agent when thinking is on
+STUB_PROFILES = {
+    "Greeting Agent": (180, 30),
+    "Mood Tracker Agent": (150, 20),
+    "CGM Agent": (260, 60),
+    "Food Intake Agent": (420, 220),
+    "Meal Planner Agent": (900, 650),
+    "Interrupt Agent": (350, 180),
+}
+
+
+def stub_stream(reasoning_tokens, answer_tokens, policy, rng):
+    """Yields content deltas the way qwen3 streams them, honouring the policy."""
+    tokens = []
+    if policy.thinking:
+        tokens += ["<think>", "\n"] + ["plan "] * reasoning_tokens + ["\n", "</think>", "\n\n"]
+    tokens += ["word "] * answer_tokens
+    tokens = tokens[:policy.max_tokens]
+
+    # Providers group tokens into deltas of varying size, splitting tags at random
+    text = "".join(tokens)
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 24)
+        yield text[i:i + size]
+        i += size
+    return len(tokens)
+
+
+def run(policies, tokens_per_second, seed):
+    rng = random.Random(seed)
+    tracker = TokenUsageTracker()
+    report = {}
+
+    for agent_name, (reasoning_tokens, answer_tokens) in STUB_PROFILES.items():
+        policy = policies[agent_name]
+        reasoning_filter = ReasoningFilter()
+        raw, visible = [], []
+        generated = 0
+        first_visible_at = None
+
+        stream = stub_stream(reasoning_tokens, answer_tokens, policy, rng)
+        while True:
+            try:
+                delta = next(stream)
+            except StopIteration as done:
+                generated = done.value
+                break
+            raw.append(delta)
+            out = reasoning_filter.feed(delta)
+            if out and first_visible_at is None:
+                first_visible_at = len("".join(raw))
+            visible.append(out)
+        visible.append(reasoning_filter.flush())
+
+        assert "".join(visible) == strip_reasoning("".join(raw)), agent_name
+        latency = generated / tokens_per_second
+        ttfv = latency * (first_visible_at or 0) / max(len("".join(raw)), 1)
+        tracker.record(agent_name, generated, reasoning_filter.hidden_chars,
+                       reasoning_filter.visible_chars, latency)
+        report[agent_name] = {
+            "ttfv": ttfv,
+            "raw_bytes": len("".join(raw).encode()),
+            "client_bytes": len("".join(visible).encode()),
+        }
+
+    summary = tracker.summary()
+    for agent_name in report:
+        report[agent_name].update(summary[agent_name])
+    return report
+
+
+def print_report(title, report):
+    print(f"\n{title}")
+    print(f"   {'Agent':<20}{'tokens':>8}{'reasoning':>11}{'to client':>11}{'first text':>12}{'total':>9}")
+    for agent_name, row in report.items():
+        print(f"   {agent_name:<20}{row['output_tokens']:>8}{row['reasoning_chars_stripped']:>10}c"
+              f"{row['client_bytes']:>10}B{row['ttfv'] * 1000:>10.0f}ms{row['avg_latency_ms']:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0,
+                        help="simulated generation speed")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print("🧪 Reasoning-token policy benchmark (offline stub)")
+    unlimited = {name: OutputPolicy(thinking=True, max_tokens=10 ** 6) for name in STUB_PROFILES}
+    baseline = run(unlimited, args.tokens_per_second, args.seed)
+    # Baseline ships the raw stream, reasoning included ("first text" is still the answer)
+    for row in baseline.values():
+        row["client_bytes"] = row["raw_bytes"]
+    policy = run(AGENT_OUTPUT_POLICIES, args.tokens_per_second, args.seed)
+
+    print_report("Baseline (thinking on, no cap, unfiltered)", baseline)
+    print_report("With AGENT_OUTPUT_POLICIES + ReasoningFilter", policy)
+
+    base_tokens = sum(row["output_tokens"] for row in baseline.values())
+    policy_tokens = sum(row["output_tokens"] for row in policy.values())
+    base_bytes = sum(row["client_bytes"] for row in baseline.values())
+    policy_bytes = sum(row["client_bytes"] for row in policy.values())
+    print(f"\n📉 Generated tokens: {base_tokens} -> {policy_tokens} "
+          f"({100 * (1 - policy_tokens / base_tokens):.0f}% fewer)")
+    print(f"📉 Bytes to client : {base_bytes} -> {policy_bytes} "
+          f"({100 * (1 - policy_bytes / base_bytes):.0f}% fewer)")
+    print("✅ Streamed filter output matches strip_reasoning() for every agent")
@@ -0,0 +1,174 @@
+"""
+WebSocket chat channel plumbing.
+
+A ChatConnection wraps one validated socket: outbound messages go through a
+bounded queue drained by a single writer task, so a slow client applies
+backpressure to the agent streaming into it instead of growing memory.
+The ConnectionRegistry indexes connections by user so the server can push
+CGM alerts and background results, and runs ONE shared heartbeat task for
+every socket (no per-connection timers), which keeps thousands of idle
+sockets per worker cheap.
+"""
+
+import asyncio
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+
+# Outbound messages buffered per connection before backpressure kicks in
+OUTBOX_SIZE = 64
+# Agent requests a single connection may have running at once
+MAX_INFLIGHT_PER_CONNECTION = 4
+# Seconds between server pings / before a silent client is dropped
+HEARTBEAT_INTERVAL = 20
+HEARTBEAT_TIMEOUT = 60
+# Seconds a streaming producer may wait on a full outbox before the client is dropped
+SEND_TIMEOUT = 10
+# Seconds to wait for the close handshake before abandoning a dead peer
+CLOSE_TIMEOUT = 5
+
+# Close codes
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013  # slow consumer
+CLOSE_INVALID_USER = 4401
+
+
+class ConnectionClosed(Exception):
+    """Raised to abort work for a connection that has gone away."""
+
+
+class ChatConnection:
+    """One validated WebSocket chat connection."""
+
+    __slots__ = ("websocket", "user_id", "user_data", "outbox", "last_seen",
+                 "inflight", "tasks", "closed", "_writer")
+
+    def __init__(self, websocket: WebSocket, user_id: str, user_data: dict):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.user_data = user_data
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self.last_seen = asyncio.get_running_loop().time()
+        self.inflight = 0
+        self.tasks: Set[asyncio.Task] = set()  # in-flight request handlers
+        self.closed = False
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def touch(self):
+        """Marks the client as alive (any inbound frame counts)."""
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def push(self, message: dict) -> bool:
+        """
+        Queues a server-initiated message without waiting. A client whose outbox
+        is already full is too slow to keep up and gets disconnected.
+        """
+        if self.closed:
+            return False
+        try:
+            self.outbox.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            print(f"[WS] Outbox full for user {self.user_id}; dropping slow connection.")
+            asyncio.create_task(self.close(CLOSE_TRY_AGAIN_LATER))
+            return False
+
+    async def send(self, message: dict):
+        """Queues a reply, waiting for room in the outbox (backpressure)."""
+        if self.closed:
+            raise ConnectionClosed()
+        try:
+            await asyncio.wait_for(self.outbox.put(message), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.close(CLOSE_TRY_AGAIN_LATER)
+            raise ConnectionClosed()
+
+    async def _write_loop(self):
+        """Single writer: drains the outbox onto the socket in order."""
+        try:
+            while True:
+                message = await self.outbox.get()
+                if message is None:
+                    break
+                await self.websocket.send_json(message)
+        except Exception:
+            # Socket is gone; the reader side will notice and unregister
+            pass
+        finally:
+            self.closed = True
+
+    async def close(self, code: int = CLOSE_GOING_AWAY):
+        """Stops the writer and closes the socket (idempotent)."""
+        if self.closed:
+            return
+        self.closed = True
+        self._writer.cancel()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), CLOSE_TIMEOUT)
+        except Exception:
+            pass
+
+
+class ConnectionRegistry:
+    """Live chat connections indexed by user_id, plus the shared heartbeat."""
+
+    def __init__(self):
+        self._by_user: Dict[str, Set[ChatConnection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return sum(len(conns) for conns in self._by_user.values())
+
+    def register(self, conn: ChatConnection):
+        self._by_user.setdefault(conn.user_id, set()).add(conn)
+
+    def unregister(self, conn: ChatConnection):
+        conns = self._by_user.get(conn.user_id)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self._by_user[conn.user_id]
+
+    def push_to_user(self, user_id: str, message: dict) -> int:
+        """Pushes a message to every connection of a user. Returns how many accepted it."""
+        return sum(conn.push(message) for conn in list(self._by_user.get(user_id, ())))
+
+    def notify_user(self, user_id: str, message: dict):
+        """Thread-safe push_to_user, for code running in the agent threadpool."""
+        if self._loop is None or user_id not in self._by_user:
+            return
+        self._loop.call_soon_threadsafe(self.push_to_user, user_id, message)
+
+    # --- Heartbeat ---
+
+    def start(self):
+        """Binds to the running event loop and starts the shared heartbeat task."""
+        self._loop = asyncio.get_running_loop()
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        """Stops the heartbeat and closes every connection."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        await asyncio.gather(*(conn.close(CLOSE_GOING_AWAY)
+                               for conns in list(self._by_user.values()) for conn in list(conns)))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = self._loop.time()
+            stale = []
+            for conns in list(self._by_user.values()):
+                for conn in list(conns):
+                    if now - conn.last_seen > HEARTBEAT_TIMEOUT:
+                        print(f"[WS] Heartbeat timeout for user {conn.user_id}.")
+                        self.unregister(conn)
+                        stale.append(conn)
+                    else:
+                        conn.push({"type": "ping"})
+            # Close concurrently so one dead peer can't stall the heartbeat for everyone
+            if stale:
+                await asyncio.gather(*(conn.close(CLOSE_GOING_AWAY) for conn in stale))
@@ -0,0 +1,318 @@
+"""
+Glucose forecasting and predictive hypo/hyper alerting.
+
+Keeps a fixed-size ring buffer of recent CGM readings per user and, on every
+insert, fits a short linear trend (rate of change in mg/dL per minute) to
+project the reading a few minutes ahead. Alerts are raised when the current
+reading is out of range OR when the forecast will leave the range, so the
+user is warned before the excursion happens instead of after.
+
+Bulk backfills are scored in a single vectorized NumPy pass across all users.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Same range the CGM Agent uses for its critical alerts.
+CGM_LOW = 80
+CGM_HIGH = 300
+
+# Alert codes (current reading out of range takes precedence over a prediction)
+ALERT_HYPO = "HYPO"
+ALERT_HYPER = "HYPER"
+ALERT_PREDICTED_HYPO = "PREDICTED_HYPO"
+ALERT_PREDICTED_HYPER = "PREDICTED_HYPER"
+
+# Trend guards: readings closer together than this carry no usable trend
+# (e.g. two manual chat entries seconds apart), and no physiologic glucose
+# change is faster than MAX_RATE mg/dL per minute.
+MIN_TREND_SPAN_MINUTES = 10
+MAX_RATE = 4.0
+
+# Forecasts are clamped to what a CGM can physically report
+PREDICTION_MIN = 40
+PREDICTION_MAX = 400
+
+
+@dataclass
+class GlucoseForecast:
+    """Trend and forecast for a single CGM reading."""
+    user_id: str
+    timestamp: float
+    value: float
+    rate_of_change: float   # mg/dL per minute
+    predicted_value: float  # mg/dL at timestamp + horizon
+    horizon_minutes: float
+    alert: Optional[str] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class BatchForecast:
+    """Column-oriented forecasts for a bulk batch, in the caller's input order."""
+    user_ids: np.ndarray
+    timestamps: np.ndarray
+    values: np.ndarray
+    rate_of_change: np.ndarray
+    predicted_values: np.ndarray
+    alert_codes: np.ndarray  # object array, None where no alert
+    horizon_minutes: float
+
+    def __len__(self):
+        return len(self.values)
+
+    def alerts(self) -> List[GlucoseForecast]:
+        """Returns only the readings that raised an alert."""
+        return [self._row(i) for i in np.flatnonzero(self.alert_codes != None)]  # noqa: E711
+
+    def latest_alerts(self) -> Dict[str, GlucoseForecast]:
+        """
+        Each user's newest reading in the batch, if that reading alerts (what should
+        be pushed to the user). Older excursions that have since resolved are skipped.
+        """
+        newest = {}
+        for i in range(len(self.values)):
+            user_id = str(self.user_ids[i])
+            current = newest.get(user_id)
+            if current is None or self.timestamps[i] >= self.timestamps[current]:
+                newest[user_id] = i
+        return {user_id: self._row(i) for user_id, i in newest.items()
+                if self.alert_codes[i] is not None}
+
+    def _row(self, i):
+        return GlucoseForecast(
+            user_id=str(self.user_ids[i]),
+            timestamp=float(self.timestamps[i]),
+            value=float(self.values[i]),
+            rate_of_change=float(self.rate_of_change[i]),
+            predicted_value=float(self.predicted_values[i]),
+            horizon_minutes=self.horizon_minutes,
+            alert=self.alert_codes[i],
+        )
+
+
+def _fit_trend(times, values, mask, min_span_minutes=MIN_TREND_SPAN_MINUTES, max_rate=MAX_RATE):
+    """
+    Least-squares slope for each row of (times, values), using only masked cells.
+    Rows whose usable points span less than min_span_minutes get a slope of 0;
+    the rest are clamped to +/- max_rate. Returns the slope in mg/dL per minute.
+    """
+    n = mask.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    t_mean = np.where(mask, times, 0.0).sum(axis=1) / safe_n
+    v_mean = np.where(mask, values, 0.0).sum(axis=1) / safe_n
+
+    dt = np.where(mask, times - t_mean[:, None], 0.0)
+    dv = np.where(mask, values - v_mean[:, None], 0.0)
+    sxx = (dt * dt).sum(axis=1)
+    sxy = (dt * dv).sum(axis=1)
+
+    span = (np.where(mask, times, -np.inf).max(axis=1)
+            - np.where(mask, times, np.inf).min(axis=1))
+    usable = (sxx > 0) & (span >= min_span_minutes * 60)
+
+    slope = np.zeros_like(sxx)
+    np.divide(sxy, sxx, out=slope, where=usable)
+    return np.clip(slope * 60.0, -max_rate, max_rate)
+
+
+class GlucoseForecastEngine:
+    """
+    Per-user ring buffers of recent CGM readings with vectorized trend forecasting.
+
+    All buffers live in two (users x capacity) arrays so that a single user's
+    insert touches one row and a bulk batch can be scored for every user at once.
+    Public methods are serialized by a lock, since inserts arrive from both the
+    agent threadpool and the event loop.
+    """
+
+    def __init__(self, capacity=12, horizon_minutes=30, lookback_minutes=30,
+                 low=CGM_LOW, high=CGM_HIGH, initial_users=64):
+        self.capacity = capacity
+        self.horizon_minutes = horizon_minutes
+        self.lookback_minutes = lookback_minutes
+        self.low = low
+        self.high = high
+
+        self._lock = threading.RLock()
+        self._rows: Dict[str, int] = {}
+        self._values = np.full((initial_users, capacity), np.nan)
+        self._times = np.full((initial_users, capacity), np.nan)
+        self._heads = np.zeros(initial_users, dtype=np.int64)  # next slot to write
+        self._counts = np.zeros(initial_users, dtype=np.int64)
+
+    # --- Buffer management ---
+
+    def _row_for(self, user_id):
+        """Returns the buffer row for a user, allocating (and growing) if needed."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is not None:
+                return row
+            row = len(self._rows)
+            if row >= len(self._heads):
+                grow = max(len(self._heads), 1)
+                self._values = np.vstack([self._values, np.full((grow, self.capacity), np.nan)])
+                self._times = np.vstack([self._times, np.full((grow, self.capacity), np.nan)])
+                self._heads = np.concatenate([self._heads, np.zeros(grow, dtype=np.int64)])
+                self._counts = np.concatenate([self._counts, np.zeros(grow, dtype=np.int64)])
+            self._rows[user_id] = row
+            return row
+
+    def history(self, user_id):
+        """Returns (timestamps, values) for a user's buffered readings, oldest first."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return np.empty(0), np.empty(0)
+            order = (self._heads[row] + np.arange(self.capacity)) % self.capacity
+            times, values = self._times[row, order], self._values[row, order]
+            valid = ~np.isnan(values)
+            return times[valid], values[valid]
+
+    def reset(self, user_id):
+        """Drops all buffered readings for a user."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is not None:
+                self._values[row] = np.nan
+                self._times[row] = np.nan
+                self._heads[row] = 0
+                self._counts[row] = 0
+
+    # --- Scoring ---
+
+    def _classify(self, values, predicted):
+        """Vectorized alert codes for current and predicted values."""
+        codes = np.full(len(values), None, dtype=object)
+        # Applied from lowest to highest precedence
+        codes[predicted > self.high] = ALERT_PREDICTED_HYPER
+        codes[predicted < self.low] = ALERT_PREDICTED_HYPO
+        codes[values > self.high] = ALERT_HYPER
+        codes[values < self.low] = ALERT_HYPO
+        return codes
+
+    def add_reading(self, user_id, value, timestamp=None) -> GlucoseForecast:
+        """Inserts one reading into the user's ring buffer and returns its forecast."""
+        with self._lock:
+            timestamp = time.time() if timestamp is None else float(timestamp)
+            row = self._row_for(user_id)
+
+            head = self._heads[row]
+            self._values[row, head] = value
+            self._times[row, head] = timestamp
+            self._heads[row] = (head + 1) % self.capacity
+            self._counts[row] = min(self._counts[row] + 1, self.capacity)
+
+            times = self._times[row][None, :]
+            values = self._values[row][None, :]
+            mask = ~np.isnan(values) & (timestamp - times <= self.lookback_minutes * 60) & (times <= timestamp)
+            rate = float(_fit_trend(times, values, mask)[0])
+            predicted = float(np.clip(float(value) + rate * self.horizon_minutes,
+                                      PREDICTION_MIN, PREDICTION_MAX))
+
+            alert = self._classify(np.array([value]), np.array([predicted]))[0]
+            return GlucoseForecast(
+                user_id=user_id,
+                timestamp=timestamp,
+                value=float(value),
+                rate_of_change=rate,
+                predicted_value=predicted,
+                horizon_minutes=self.horizon_minutes,
+                alert=alert,
+            )
+
+    def add_readings(self, user_ids: Sequence[str], values: Sequence[float],
+                     timestamps: Sequence[float]) -> BatchForecast:
+        """
+        Scores a bulk batch (e.g. a device backfill) across all users in one pass.
+
+        Each reading is forecast from the readings that precede it in time, whether
+        they were already buffered or arrive in the same batch, so the result matches
+        inserting the readings one by one in timestamp order. The ring buffers end
+        up holding the most recent `capacity` readings for every user in the batch.
+        """
+        with self._lock:
+            user_ids = np.asarray(user_ids, dtype=object)
+            values = np.asarray(values, dtype=np.float64)
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+            if not (len(user_ids) == len(values) == len(timestamps)):
+                raise ValueError("user_ids, values and timestamps must have the same length")
+            if len(values) == 0:
+                empty = np.empty(0)
+                return BatchForecast(user_ids, empty, empty, empty, empty,
+                                     np.empty(0, dtype=object), self.horizon_minutes)
+
+            # 1. Map users to buffer rows (one dict lookup per distinct user)
+            unique_users, inverse = np.unique(user_ids, return_inverse=True)
+            unique_rows = np.array([self._row_for(u) for u in unique_users], dtype=np.int64)
+            batch_rows = unique_rows[inverse]
+
+            # 2. Pull the existing buffered history of those users, oldest first
+            order = (self._heads[unique_rows][:, None] + np.arange(self.capacity)) % self.capacity
+            hist_values = np.take_along_axis(self._values[unique_rows], order, axis=1)
+            hist_times = np.take_along_axis(self._times[unique_rows], order, axis=1)
+            hist_valid = ~np.isnan(hist_values)
+            hist_rows = np.broadcast_to(unique_rows[:, None], hist_values.shape)[hist_valid]
+
+            # 3. Merge history + batch, sorted by (row, timestamp); history wins ties
+            n_hist = int(hist_valid.sum())
+            all_rows = np.concatenate([hist_rows, batch_rows])
+            all_times = np.concatenate([hist_times[hist_valid], timestamps])
+            all_values = np.concatenate([hist_values[hist_valid], values])
+            sequence = np.arange(len(all_rows))
+            sort = np.lexsort((sequence, all_times, all_rows))
+            all_rows, all_times, all_values = all_rows[sort], all_times[sort], all_values[sort]
+
+            n = len(all_rows)
+            starts = np.flatnonzero(np.r_[True, all_rows[1:] != all_rows[:-1]])
+            ends = np.r_[starts[1:], n]
+            group = np.cumsum(np.r_[True, all_rows[1:] != all_rows[:-1]]) - 1
+            group_start = starts[group]
+
+            # 4. Trailing window of up to `capacity` readings for every position
+            window = np.arange(n)[:, None] + np.arange(-self.capacity + 1, 1)
+            in_group = window >= group_start[:, None]
+            window = np.maximum(window, 0)
+            win_times = all_times[window]
+            win_values = all_values[window]
+            mask = in_group & (all_times[:, None] - win_times <= self.lookback_minutes * 60)
+
+            rates = _fit_trend(win_times, win_values, mask)
+            predicted = np.clip(all_values + rates * self.horizon_minutes,
+                                PREDICTION_MIN, PREDICTION_MAX)
+            codes = self._classify(all_values, predicted)
+
+            # 5. Results back in the caller's input order
+            position = np.empty(n, dtype=np.int64)
+            position[sort] = np.arange(n)
+            batch_pos = position[n_hist:]
+
+            # 6. Rewrite the buffers with each user's most recent `capacity` readings
+            from_end = ends[group] - 1 - np.arange(n)
+            keep = from_end < self.capacity
+            kept = np.minimum(ends - starts, self.capacity)
+            cols = kept[group][keep] - 1 - from_end[keep]
+
+            self._values[unique_rows] = np.nan
+            self._times[unique_rows] = np.nan
+            self._values[all_rows[keep], cols] = all_values[keep]
+            self._times[all_rows[keep], cols] = all_times[keep]
+            self._heads[all_rows[starts]] = kept % self.capacity
+            self._counts[all_rows[starts]] = kept
+
+            return BatchForecast(
+                user_ids=user_ids,
+                timestamps=timestamps,
+                values=values,
+                rate_of_change=rates[batch_pos],
+                predicted_values=predicted[batch_pos],
+                alert_codes=codes[batch_pos],
+                horizon_minutes=self.horizon_minutes,
+            )
@@ -1,11 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import asyncio
+import json
+import math
 import os
 import re
 import sqlite3
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import List
 from dotenv import load_dotenv
 
+from glucose_forecast import GlucoseForecastEngine
+from output_policy import AGENT_OUTPUT_POLICIES, ReasoningFilter, TokenUsageTracker, describe_policies
+from chat_socket import (
+    ChatConnection, ConnectionRegistry, ConnectionClosed,
+    MAX_INFLIGHT_PER_CONNECTION, CLOSE_INVALID_USER,
+)
+
 # Agno and Model imports
 from agno.agent import Agent
 from agno.models.groq import Groq
@@ -36,6 +51,12 @@ app.add_middleware(
 async def startup_event():
     """Initialize database tables on application startup."""
     initialize_database()
+    chat_registry.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close all open chat sockets."""
+    await chat_registry.stop()
 
 def initialize_database():
     """Creates the SQLite database tables if they don't exist."""
@@ -201,17 +222,137 @@ def log_data_to_db(user_id: str, log_type: str, value_text: str = None, value_in
         if conn:
             conn.close()
 
+def get_existing_user_ids(user_ids):
+    """Returns the subset of user_ids that exist in the Users table."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        unique_ids = list(set(user_ids))
+        existing = set()
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(unique_ids), 500):
+            chunk = unique_ids[i:i + 500]
+            cursor.execute(
+                f"SELECT user_id FROM Users WHERE user_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
+    except sqlite3.Error as e:
+        print(f"[ERROR] Database error while checking user IDs: {e}")
+        return set()
+    finally:
+        if conn:
+            conn.close()
+
+def log_cgm_batch_to_db(user_ids, values, timestamps):
+    """
+    Bulk-inserts CGM readings (e.g. a device backfill) into the Logs table in one
+    transaction and updates latest_cgm with each user's most recent reading.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        rows = [
+            (user_id, 'CGM', int(value),
+             datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+            for user_id, value, ts in zip(user_ids, values, timestamps)
+        ]
+        cursor.executemany(
+            '''
+            INSERT INTO Logs (user_id, type, value_int, timestamp)
+            VALUES (?, ?, ?, ?)
+            ''',
+            rows
+        )
+
+        latest = {}
+        for user_id, value, ts in zip(user_ids, values, timestamps):
+            if user_id not in latest or ts >= latest[user_id][1]:
+                latest[user_id] = (int(value), ts)
+        cursor.executemany(
+            '''
+            UPDATE Users SET latest_cgm = ? WHERE user_id = ?
+            ''',
+            [(value, user_id) for user_id, (value, _) in latest.items()]
+        )
+
+        conn.commit()
+        print(f"[DB LOG] Backfilled {len(rows)} CGM readings for {len(latest)} users.")
+    except (sqlite3.Error, ValueError, OverflowError, OSError) as e:
+        print(f"[ERROR] Database error while backfilling CGM data: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+# --- 2b. GLUCOSE FORECASTING ---
+# Ring buffer of recent readings per user; forecasts 30 minutes ahead so alerts
+# fire before the reading actually leaves the 80-300 mg/dL range.
+glucose_engine = GlucoseForecastEngine(capacity=12, horizon_minutes=30)
+
+# Manually typed readings outside this range are parse mistakes, not glucose
+MANUAL_CGM_MIN = 20
+MANUAL_CGM_MAX = 600
+# Backfilled readings must fall inside this window around the server clock
+BACKFILL_MAX_AGE_DAYS = 90
+BACKFILL_MAX_FUTURE_SECONDS = 300
+
+def extract_cgm_value(message):
+    """
+    Pulls a glucose reading out of free text. Prefers the number next to
+    'mg/dL' or after 'glucose'/'sugar'/'CGM', so "At 7am my glucose was 250"
+    gives 250, not 7. Returns None when no plausible reading is found.
+    """
+    lower_message = message.lower()
+    candidates = re.findall(r'(\d+(?:\.\d+)?)\s*mg\s*/?\s*dl', lower_message)
+    candidates += re.findall(r'(?:glucose|sugar|cgm)\D{0,20}?(\d+(?:\.\d+)?)', lower_message)
+    candidates += re.findall(r'(\d+(?:\.\d+)?)', lower_message)
+    for candidate in candidates:
+        value = round(float(candidate))
+        if MANUAL_CGM_MIN <= value <= MANUAL_CGM_MAX:
+            return value
+    return None
+
+# Open WebSocket chat connections, used to push CGM alerts and background results
+chat_registry = ConnectionRegistry()
+
+def push_cgm_alert(forecast):
+    """Pushes a CGM alert to all of the user's open chat sockets, from any thread."""
+    if forecast.alert:
+        chat_registry.notify_user(forecast.user_id, {"type": "cgm_alert", "forecast": forecast.to_dict()})
+
 
 # --- 3. AGENT DEFINITIONS (Qwen 32B on Groq) ---
 # Using the models specified in your input file
-FAST_LLM = Groq(id="qwen/qwen3-32b")
-SMART_LLM = Groq(id="qwen/qwen3-32b")
+QWEN_MODEL_ID = "qwen/qwen3-32b"
+
+def build_model(agent_name, thinking=None):
+    """
+    Creates the Groq model for an agent, applying its output policy. Reasoning
+    that is still generated is stripped before it reaches the client (see run_agent_text).
+    Pass thinking=False to force reasoning off regardless of the policy.
+    """
+    policy = AGENT_OUTPUT_POLICIES[agent_name]
+    if thinking is not None:
+        policy = replace(policy, thinking=thinking)
+    return Groq(
+        id=QWEN_MODEL_ID,
+        max_tokens=policy.max_tokens,
+        request_params=policy.request_params() or None,
+    )
+
+# Generated-token counts per agent, reported by /api/agent_usage
+agent_usage = TokenUsageTracker()
 
 # 1. Greeting Agent
 greeting_agent = Agent(
     name="Greeting Agent",
     role="Validates user ID and provides a personalized welcome message.",
-    model=FAST_LLM,
+    model=build_model("Greeting Agent"),
     instructions=[
         "Validate the provided User ID. Retrieve the user's First Name and City to greet them personally (e.g., 'Hello, [Name] from [City]!').",
         "If invalid, prompt the user to re-enter a valid ID and block further interaction."
@@ -223,7 +364,7 @@ greeting_agent = Agent(
 mood_tracker_agent = Agent(
     name="Mood Tracker Agent",
     role="Records the user's emotional state and analyzes trends.",
-    model=FAST_LLM,
+    model=build_model("Mood Tracker Agent"),
     instructions=[
         "Extract a single mood label (happy, sad, excited, tired, etc.) from the user's input.",
         "Acknowledge the mood (e.g., 'Noted. Feeling 'happy' today!')."
@@ -235,9 +376,10 @@ mood_tracker_agent = Agent(
 CGM_agent = Agent(
     name="CGM Agent",
     role="Logs Continuous Glucose Monitor readings and flags alerts if outside the range of 80-300 mg/dL.",
-    model=FAST_LLM,
+    model=build_model("CGM Agent"),
     instructions=[
-        "Validate the input glucose reading. If the reading is outside 80-300 mg/dL, issue an immediate, bold **CRITICAL ALERT**."
+        "Validate the input glucose reading. If the reading is outside 80-300 mg/dL, issue an immediate, bold **CRITICAL ALERT**.",
+        "If a trend forecast is provided and the predicted value is outside 80-300 mg/dL, issue a bold **PREDICTED ALERT** with the forecast and a short suggestion."
     ],
     markdown=True,
 )
@@ -246,7 +388,7 @@ CGM_agent = Agent(
 food_intake_agent = Agent(
     name="Food Intake Agent",
     role="Records meals/snacks and categorizes their macronutrients (carbs/protein/fat) in a table format.",
-    model=SMART_LLM,
+    model=build_model("Food Intake Agent"),
     instructions=[
         "Take a free-text meal description.",
         "Estimate and categorize the meal into grams of Carbs, Protein, and Fat, and display the result in a markdown table.",
@@ -259,7 +401,7 @@ food_intake_agent = Agent(
 meal_planner_agent = Agent(
     name="Meal Planner Agent",
     role="Generates adaptive meal plans based on user health data and constraints.",
-    model=SMART_LLM,
+    model=build_model("Meal Planner Agent"),
     instructions=[
         "Analyze the provided user data (Conditions, Preference, CGM).",
         "If the CGM reading is high or low, generate the next 3 meals specifically designed to bring glucose under control. The plan MUST be a 3-meal plan (Breakfast, Lunch, Dinner).",
@@ -273,7 +415,7 @@ meal_planner_agent = Agent(
 interrupt_agent = Agent(
     name="Interrupt Agent",
     role="Handles general queries without losing main flow context. Use Google Search for external queries.",
-    model=FAST_LLM,
+    model=build_model("Interrupt Agent"),
     instructions=[
         "Answer unrelated user queries gracefully.",
         "After answering, route the user back to the main interaction flow with a closing sentence like: 'Now, what would you like to log or plan next?'"
@@ -282,12 +424,27 @@ interrupt_agent = Agent(
 )
 
 
+# Reasoning shares the max_tokens budget with the answer. When a thinking agent
+# spends all of it inside <think>, the request is retried on this no-thinking copy.
+NO_THINK_FALLBACK_AGENTS = {
+    agent.name: agent.deep_copy(update={"model": build_model(agent.name, thinking=False)})
+    for agent in (food_intake_agent, meal_planner_agent, interrupt_agent)
+}
+
+EMPTY_RESPONSE_MESSAGE = "I'm sorry, I couldn't finish that answer. Please try again or ask a shorter question."
+
+
 # --- 4. API REQUEST SCHEMA ---
 class AgentRequest(BaseModel):
     user_id: str
     intent: str  # e.g., 'validate', 'log_cgm', 'generate_plan', 'general_query', 'log_mood', 'log_food'
     message: str # user's free text input
 
+class CGMBackfillRequest(BaseModel):
+    user_ids: List[str]      # one entry per reading
+    values: List[float]      # mg/dL
+    timestamps: List[float]  # unix epoch seconds
+
 
 # --- 5. API ENDPOINT (FASTAPI) ---
 
@@ -297,11 +454,13 @@ def health_check():
     return {"status": "ok", "message": "Personalized Healthcare Agent is running."}
 
 @app.post("/api/run_agent")
-async def run_agent(request: AgentRequest):
+def run_agent(request: AgentRequest):
     """
     The main endpoint for handling all agent-based interactions, 
     matching the logic from your original run_demo.py flow.
     Enhanced to better handle unified chatbot interactions.
+    Plain `def` so FastAPI runs it in the threadpool: the agent and DB calls
+    block, and must not stall the chat sockets sharing the event loop.
     """
     user_id = request.user_id
     intent = request.intent.lower() # Normalize intent for matching
@@ -311,44 +470,120 @@ async def run_agent(request: AgentRequest):
     if intent == "auto_detect":
         intent = auto_detect_intent(user_message)
     
-    # 1. Validation/Greeting Intent (Only intent that runs without full user data check)
-    if intent == 'validate':
-        user_data = get_user_data_from_db(user_id)
-        if not user_data:
+    # --- Guard: every intent requires a valid user ---
+    user_data = get_user_data_from_db(user_id)
+    if not user_data:
+        if intent == 'validate':
             return {"agent_response": "Invalid ID. Please use a valid ID, such as '1001', for this demo."}
-        
+        return {"agent_response": "Please validate your User ID before proceeding with logs or plans."}
+
+    return dispatch_intent(user_id, intent, user_message, user_data)
+
+def run_agent_text(agent, prompt, on_chunk=None):
+    """
+    Runs an agent and returns its visible output as text, with any <think>
+    reasoning stripped. When on_chunk is given the agent is streamed and every
+    filtered delta is passed to it as it arrives. Token usage is recorded per agent.
+
+    If the run produced reasoning but no visible answer (the token budget ran out
+    inside <think>), it is retried once with thinking off; if that is still empty,
+    a short apology is returned instead of an empty response.
+    """
+    text, reasoning_filter = _run_agent_once(agent, prompt, on_chunk)
+    if reasoning_filter.visible_chars == 0 and reasoning_filter.hidden_chars > 0:
+        fallback = NO_THINK_FALLBACK_AGENTS.get(agent.name)
+        if fallback is not None:
+            print(f"[WARN] {agent.name} exhausted its token budget while reasoning; retrying without thinking.")
+            text, reasoning_filter = _run_agent_once(fallback, prompt, on_chunk)
+
+    if not text.strip():
+        text = EMPTY_RESPONSE_MESSAGE
+        if on_chunk is not None:
+            on_chunk(text)
+    return text
+
+def _run_agent_once(agent, prompt, on_chunk):
+    """Single agent run behind run_agent_text; returns (visible text, ReasoningFilter)."""
+    reasoning_filter = ReasoningFilter()
+    started = time.perf_counter()
+
+    if on_chunk is None:
+        response = agent.run(prompt)
+        text = reasoning_filter.feed(str(response.content or "")) + reasoning_filter.flush()
+        metrics = response.metrics
+    else:
+        parts = []
+        metrics = None
+        for event in agent.run(prompt, stream=True, stream_events=True):
+            event_type = getattr(event, "event", None)
+            if event_type == "RunContent" and isinstance(event.content, str):
+                visible = reasoning_filter.feed(event.content)
+                if visible:
+                    parts.append(visible)
+                    on_chunk(visible)
+            elif event_type == "RunCompleted":
+                metrics = event.metrics
+        tail = reasoning_filter.flush()
+        if tail:
+            parts.append(tail)
+            on_chunk(tail)
+        text = "".join(parts)
+
+    agent_usage.record(
+        agent.name,
+        getattr(metrics, "output_tokens", None) or None,
+        reasoning_filter.hidden_chars,
+        reasoning_filter.visible_chars,
+        time.perf_counter() - started,
+    )
+    return text, reasoning_filter
+
+def dispatch_intent(user_id, intent, user_message, user_data, on_chunk=None):
+    """
+    Runs the agent for an intent on behalf of an already-validated user and
+    applies its DB side effects. Shared by the HTTP and WebSocket channels;
+    blocking, so the WebSocket channel calls it from the threadpool.
+    """
+    # 1. Validation/Greeting Intent
+    if intent == 'validate':
         # Prepare context for the agent
         context_prompt = (
             f"My user ID is {user_id}. Please validate me. My name is {user_data['first_name']} "
             f"and I live in {user_data['city']}."
         )
-        response = greeting_agent.run(context_prompt)
+        response = run_agent_text(greeting_agent, context_prompt, on_chunk)
         
         # Return user data with response
-        return {"agent_response": str(response), "user_data": user_data}
-        
-    # --- Guards for Log/Plan Intents (Requires Validated User) ---
-    user_data = get_user_data_from_db(user_id)
-    if not user_data:
-         return {"agent_response": "Please validate your User ID before proceeding with logs or plans."}
+        return {"agent_response": response, "user_data": user_data}
 
     # 2. CGM Log Intent
     if intent == 'log_cgm':
-        response = CGM_agent.run(user_message)
-        
-        # Attempt to extract the number for DB update and logging
+        # Attempt to extract the number for forecasting, DB update and logging
+        forecast = None
         try:
-            cgm_match = re.search(r'(\d+)', user_message)
-            if cgm_match:
-                cgm_value = int(cgm_match.group(1))
-                if cgm_value > 0:
-                    log_data_to_db(user_id, 'CGM', value_int=cgm_value)
-                    updated_data = get_user_data_from_db(user_id)
-                    return {"agent_response": str(response), "user_data": updated_data}
+            cgm_value = extract_cgm_value(user_message)
+            if cgm_value is not None:
+                forecast = glucose_engine.add_reading(user_id, cgm_value)
+                log_data_to_db(user_id, 'CGM', value_int=cgm_value)
+                push_cgm_alert(forecast)
         except Exception as e:
             print(f"[ERROR] Failed to log CGM data: {e}")
-            
-        return {"agent_response": str(response), "user_data": user_data}
+
+        prompt = user_message
+        if forecast is not None:
+            prompt = (
+                f"{user_message}\n"
+                f"Trend: {forecast.rate_of_change:+.1f} mg/dL/min. "
+                f"Forecast in {forecast.horizon_minutes} minutes: {forecast.predicted_value:.0f} mg/dL. "
+                f"Alert: {forecast.alert or 'none'}."
+            )
+        response = run_agent_text(CGM_agent, prompt, on_chunk)
+
+        if forecast is not None:
+            updated_data = get_user_data_from_db(user_id)
+            return {"agent_response": response, "user_data": updated_data,
+                    "cgm_forecast": forecast.to_dict()}
+        return {"agent_response": response, "user_data": user_data}
 
     # 3. Meal Plan Generation Intent
     elif intent == 'generate_plan':
@@ -360,39 +595,195 @@ async def run_agent(request: AgentRequest):
             f"Physical Limitations: {user_data.get('physical_limitations', 'N/A')}. "
             f"Latest CGM Reading: {user_data.get('latest_cgm', 'N/A')} mg/dL."
         )
-        response = meal_planner_agent.run(prompt)
-        return {"agent_response": str(response), "user_data": user_data}
+        response = run_agent_text(meal_planner_agent, prompt, on_chunk)
+        return {"agent_response": response, "user_data": user_data}
 
     # 4. Food Log Intent
     elif intent == 'log_food':
-        response = food_intake_agent.run(user_message)
-        
-        # Log the raw text of the meal.
+        # Log the raw text of the meal first, so the entry survives a client
+        # disconnecting mid-stream.
         log_data_to_db(user_id, 'FOOD', value_text=user_message)
         
-        return {"agent_response": str(response), "user_data": user_data}
+        response = run_agent_text(food_intake_agent, user_message, on_chunk)
+        
+        return {"agent_response": response, "user_data": user_data}
 
     # 5. Mood Log Intent
     elif intent == 'log_mood':
-        response = mood_tracker_agent.run(user_message)
-        
-        # --- LOGGING MOOD ---
+        # --- LOGGING MOOD --- (before the agent runs, like the food log)
         match = re.search(r'(happy|sad|excited|tired|anxious|stressed|neutral)', user_message.lower())
         if match:
             mood_value = match.group(1).capitalize()
             log_data_to_db(user_id, 'MOOD', value_text=mood_value)
         # --- END LOGGING MOOD ---
         
+        response = run_agent_text(mood_tracker_agent, user_message, on_chunk)
+        
         updated_data = get_user_data_from_db(user_id)
-        return {"agent_response": str(response), "user_data": updated_data}
+        return {"agent_response": response, "user_data": updated_data}
 
     # 6. General Query (Interrupt)
     elif intent == 'general_query':
-        response = interrupt_agent.run(user_message)
-        return {"agent_response": str(response), "user_data": user_data}
+        response = run_agent_text(interrupt_agent, user_message, on_chunk)
+        return {"agent_response": response, "user_data": user_data}
 
     return {"agent_response": "Unknown intent. How can I assist you today?"}
 
+@app.get("/api/agent_usage")
+def agent_usage_report():
+    """Output policies and generated-token counts per agent since startup."""
+    return {"policies": describe_policies(AGENT_OUTPUT_POLICIES), "usage": agent_usage.summary()}
+
+@app.post("/api/cgm/backfill")
+def cgm_backfill(request: CGMBackfillRequest):
+    """
+    Bulk CGM ingestion (e.g. a device sync). All readings are scored in one
+    vectorized pass and logged in a single transaction; no agent is invoked.
+    Runs in the threadpool (plain `def`) to keep the DB work off the event loop.
+    """
+    if not (len(request.user_ids) == len(request.values) == len(request.timestamps)):
+        return {"error": "user_ids, values and timestamps must have the same length."}
+
+    # Validate everything before the engine or the DB is touched
+    if not all(math.isfinite(value) and value > 0 for value in request.values):
+        return {"error": "values must be finite, positive mg/dL readings."}
+    now = time.time()
+    oldest = now - BACKFILL_MAX_AGE_DAYS * 86400
+    newest = now + BACKFILL_MAX_FUTURE_SECONDS
+    if not all(math.isfinite(ts) and oldest <= ts <= newest for ts in request.timestamps):
+        return {"error": f"timestamps must be unix epoch seconds (not milliseconds) "
+                         f"within the last {BACKFILL_MAX_AGE_DAYS} days."}
+    unknown = set(request.user_ids) - get_existing_user_ids(request.user_ids)
+    if unknown:
+        return {"error": f"Unknown user IDs: {', '.join(sorted(unknown)[:10])}"}
+
+    result = glucose_engine.add_readings(request.user_ids, request.values, request.timestamps)
+    log_cgm_batch_to_db(request.user_ids, request.values, request.timestamps)
+
+    # Only push alerts that are still live; older ones are reported in the body only
+    latest_alerts = result.latest_alerts()
+    for forecast in latest_alerts.values():
+        if now - forecast.timestamp <= forecast.horizon_minutes * 60:
+            push_cgm_alert(forecast)
+
+    return {
+        "readings": len(result),
+        "alert_count": len(result.alerts()),
+        "alerts": [forecast.to_dict() for forecast in latest_alerts.values()],
+    }
+
+@app.websocket("/ws/chat/{user_id}")
+async def chat_socket(websocket: WebSocket, user_id: str):
+    """
+    Persistent chat channel. The user is validated once when the socket opens;
+    after that the client sends multiplexed requests:
+
+        {"type": "message", "request_id": "...", "intent": "auto_detect", "message": "...",
+         "background": false}
+
+    and receives {"type": "chunk"} deltas followed by one {"type": "result"} per
+    request_id. Background requests are not streamed; their result is pushed to
+    every socket of the user when done. The server also pushes {"type": "cgm_alert"}
+    and {"type": "ping"} heartbeats (answer with {"type": "pong"}).
+    """
+    await websocket.accept()
+
+    user_data = await run_in_threadpool(get_user_data_from_db, user_id)
+    if not user_data:
+        await websocket.send_json({"type": "error", "error": "Invalid ID. Please use a valid ID, such as '1001', for this demo."})
+        await websocket.close(code=CLOSE_INVALID_USER)
+        return
+
+    conn = ChatConnection(websocket, user_id, user_data)
+    chat_registry.register(conn)
+    conn.push({"type": "welcome", "user_data": user_data})
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            conn.touch()
+            # Binary frames and invalid JSON are answered with an error below
+            try:
+                message = json.loads(frame["text"]) if frame.get("text") is not None else None
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                conn.push({"type": "error", "error": "Messages must be JSON objects."})
+                continue
+
+            message_type = message.get("type")
+            if message_type == "pong":
+                continue
+            if message_type == "ping":
+                conn.push({"type": "pong"})
+                continue
+            if message_type != "message":
+                conn.push({"type": "error", "request_id": message.get("request_id"),
+                           "error": f"Unknown message type: {message_type}"})
+                continue
+
+            if conn.inflight >= MAX_INFLIGHT_PER_CONNECTION:
+                conn.push({"type": "error", "request_id": message.get("request_id"),
+                           "error": "Too many requests in flight. Please wait for a reply."})
+                continue
+            conn.inflight += 1
+            # Keep a reference so in-flight requests aren't garbage-collected
+            task = asyncio.create_task(handle_socket_message(conn, message))
+            conn.tasks.add(task)
+            task.add_done_callback(conn.tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_registry.unregister(conn)
+        await conn.close()
+
+async def handle_socket_message(conn: ChatConnection, message: dict):
+    """Runs one multiplexed chat request in the threadpool and delivers its output."""
+    request_id = message.get("request_id")
+    user_message = str(message.get("message", ""))
+    intent = str(message.get("intent") or "auto_detect").lower()
+    background = bool(message.get("background"))
+    if intent == "auto_detect":
+        intent = auto_detect_intent(user_message)
+
+    loop = asyncio.get_running_loop()
+    on_chunk = None
+    if not background:
+        def on_chunk(delta):
+            # Blocks the agent thread while the client's outbox is full
+            asyncio.run_coroutine_threadsafe(
+                conn.send({"type": "chunk", "request_id": request_id, "delta": delta}), loop
+            ).result()
+
+    try:
+        # Validated once per connection, but the profile is re-read per request:
+        # latest_cgm and mood change through other channels (HTTP, backfills)
+        user_data = await run_in_threadpool(get_user_data_from_db, conn.user_id)
+        if not user_data:
+            conn.push({"type": "error", "request_id": request_id,
+                       "error": "Please validate your User ID before proceeding with logs or plans."})
+            return
+        conn.user_data = user_data
+
+        result = await run_in_threadpool(dispatch_intent, conn.user_id, intent, user_message,
+                                         user_data, on_chunk)
+        payload = {"type": "result", "request_id": request_id, "intent": intent, **result}
+
+        if background:
+            chat_registry.push_to_user(conn.user_id, payload)
+        else:
+            await conn.send(payload)
+    except ConnectionClosed:
+        pass
+    except Exception as e:
+        print(f"[ERROR] Chat socket request {request_id} failed: {e}")
+        conn.push({"type": "error", "request_id": request_id,
+                   "error": "I apologize, but I'm having trouble responding right now. Please try again."})
+    finally:
+        conn.inflight -= 1
+
 def auto_detect_intent(message: str) -> str:
     """Automatically detect the intent based on the user message."""
     lower_message = message.lower()
@@ -0,0 +1,172 @@
+"""
+Output-budget policy and reasoning post-processing for the qwen3 agents.
+
+qwen/qwen3-32b emits a <think>...</think> reasoning block before its answer
+unless reasoning is switched off. Each agent gets an OutputPolicy (thinking
+on/off and a max output token budget); whatever reasoning is still generated
+is stripped by ReasoningFilter before it reaches the client, and
+TokenUsageTracker reports generated tokens per agent.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Rough chars-per-token ratio, used only when the provider reports no usage
+CHARS_PER_TOKEN = 4
+
+_THINK_BLOCK = re.compile(r"<think>.*?(?:</think>|$)\s*", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class OutputPolicy:
+    """Per-agent generation budget."""
+    thinking: bool    # let the model emit reasoning before answering
+    max_tokens: int   # hard cap on generated tokens (reasoning included)
+
+    def request_params(self):
+        """Extra Groq request parameters implementing this policy."""
+        if self.thinking:
+            return {}
+        # qwen3 on Groq: skip the reasoning phase entirely
+        return {"reasoning_effort": "none"}
+
+
+# Output budget per agent. Short acknowledgements skip qwen3's reasoning phase
+# entirely; planning/analysis agents keep it.
+AGENT_OUTPUT_POLICIES = {
+    "Greeting Agent": OutputPolicy(thinking=False, max_tokens=256),
+    "Mood Tracker Agent": OutputPolicy(thinking=False, max_tokens=128),
+    "CGM Agent": OutputPolicy(thinking=False, max_tokens=384),
+    "Food Intake Agent": OutputPolicy(thinking=True, max_tokens=1536),
+    "Meal Planner Agent": OutputPolicy(thinking=True, max_tokens=3072),
+    "Interrupt Agent": OutputPolicy(thinking=True, max_tokens=1024),
+}
+
+
+def strip_reasoning(text: str) -> str:
+    """Removes <think> blocks (including an unterminated one) from a complete response."""
+    return _THINK_BLOCK.sub("", text)
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class ReasoningFilter:
+    """
+    Streaming-safe <think> stripper. Feed it content deltas as they arrive;
+    it returns only the visible text, holding back at most a few characters
+    when a delta ends in what could be the start of a tag split across chunks.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._inside = False
+        self._strip_leading = False
+        self.hidden_chars = 0
+        self.visible_chars = 0
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        visible = []
+
+        while self._buffer:
+            if self._inside:
+                end = self._buffer.find(THINK_CLOSE)
+                if end == -1:
+                    keep = _partial_tag_suffix(self._buffer, THINK_CLOSE)
+                    self.hidden_chars += len(self._buffer) - keep
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                self.hidden_chars += end
+                self._buffer = self._buffer[end + len(THINK_CLOSE):]
+                self._inside = False
+                self._strip_leading = True
+            else:
+                if self._strip_leading:
+                    self._buffer = self._buffer.lstrip()
+                    if not self._buffer:
+                        break
+                    self._strip_leading = False
+
+                start = self._buffer.find(THINK_OPEN)
+                if start == -1:
+                    keep = _partial_tag_suffix(self._buffer, THINK_OPEN)
+                    visible.append(self._buffer[:len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                visible.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(THINK_OPEN):]
+                self._inside = True
+
+        text = "".join(visible)
+        self.visible_chars += len(text)
+        return text
+
+    def flush(self) -> str:
+        """Releases any held-back text at the end of the stream."""
+        text = "" if self._inside else self._buffer
+        if self._inside:
+            self.hidden_chars += len(self._buffer)
+        self._buffer = ""
+        self.visible_chars += len(text)
+        return text
+
+
+class TokenUsageTracker:
+    """Thread-safe per-agent counters for generated tokens and latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage: Dict[str, dict] = {}
+
+    def record(self, agent_name, output_tokens, reasoning_chars, visible_chars, duration):
+        """
+        Records one agent run. output_tokens is the provider-reported count
+        (reasoning included); pass None to estimate it from the generated text.
+        """
+        estimated = output_tokens is None
+        if estimated:
+            output_tokens = (reasoning_chars + visible_chars) // CHARS_PER_TOKEN
+        with self._lock:
+            usage = self._usage.setdefault(agent_name, {
+                "calls": 0, "output_tokens": 0, "estimated_calls": 0,
+                "reasoning_chars_stripped": 0, "visible_chars": 0, "total_seconds": 0.0,
+            })
+            usage["calls"] += 1
+            usage["output_tokens"] += int(output_tokens)
+            usage["estimated_calls"] += int(estimated)
+            usage["reasoning_chars_stripped"] += reasoning_chars
+            usage["visible_chars"] += visible_chars
+            usage["total_seconds"] += duration
+
+    def summary(self):
+        """Per-agent totals plus averages per call."""
+        with self._lock:
+            report = {}
+            for agent_name, usage in self._usage.items():
+                calls = usage["calls"]
+                report[agent_name] = dict(
+                    usage,
+                    avg_output_tokens=usage["output_tokens"] / calls,
+                    avg_latency_ms=usage["total_seconds"] * 1000 / calls,
+                )
+            return report
+
+    def reset(self):
+        with self._lock:
+            self._usage.clear()
+
+
+def describe_policies(policies: Dict[str, OutputPolicy]):
+    """JSON-friendly view of a name -> OutputPolicy mapping."""
+    return {name: asdict(policy) for name, policy in policies.items()}
@@ -6,6 +6,7 @@ Test script to verify the multi-agent backend is working correctly
 import requests
 import json
 import time
+import websocket
 
 def test_backend():
     """Test the multi-agent backend endpoints"""
@@ -102,11 +103,135 @@ def test_backend():
         print(f"❌ Mood request failed: {e}")
         return False
     
+    # Test 5: CGM Backfill
+    print("\n5. Testing CGM backfill...")
+    try:
+        now = time.time()
+        timestamps = [now - 300 * i for i in range(12, 0, -1)]
+        test_request = {
+            "user_ids": ["1001"] * len(timestamps),
+            "values": [140] * len(timestamps),
+            "timestamps": timestamps
+        }
+        response = requests.post(f"{base_url}/api/cgm/backfill", json=test_request, timeout=10)
+        result = response.json()
+        if response.status_code == 200 and result.get("readings") == len(timestamps) and not result.get("alerts"):
+            print("✅ CGM backfill passed")
+            print(f"   Result: {result}")
+        else:
+            print(f"❌ CGM backfill failed: {response.status_code} {result}")
+            return False
+        
+        # Millisecond timestamps and unknown users must be rejected without side effects
+        bad_requests = [
+            dict(test_request, timestamps=[ts * 1000 for ts in timestamps]),
+            dict(test_request, user_ids=["invalid-user"] * len(timestamps)),
+        ]
+        for bad_request in bad_requests:
+            response = requests.post(f"{base_url}/api/cgm/backfill", json=bad_request, timeout=10)
+            if "error" not in response.json():
+                print(f"❌ Invalid backfill was accepted: {response.json()}")
+                return False
+        print("✅ Invalid backfills rejected")
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Backfill request failed: {e}")
+        return False
+    
+    # Test 6: WebSocket chat channel
+    print("\n6. Testing WebSocket chat channel...")
+    if not test_chat_socket(base_url.replace("http", "ws", 1)):
+        return False
+    
     print("\n" + "=" * 50)
     print("🎉 All tests passed! Multi-agent backend is working correctly.")
     print("🚀 You can now start the frontend with: npm run dev")
     return True
 
+def receive_until(ws, message_type, request_id=None):
+    """Reads frames until one of the given type (and request_id) arrives, skipping pushes."""
+    while True:
+        message = json.loads(ws.recv())
+        if message.get("type") == message_type and (request_id is None or message.get("request_id") == request_id):
+            return message
+        if message.get("type") == "error":
+            raise AssertionError(f"Server error: {message.get('error')}")
+
+def test_chat_socket(ws_url):
+    """Test the WebSocket protocol: welcome, multiplexing, heartbeat, pushes, invalid user"""
+    try:
+        ws = websocket.create_connection(f"{ws_url}/ws/chat/1001", timeout=30)
+        other = websocket.create_connection(f"{ws_url}/ws/chat/1001", timeout=30)
+
+        # 5a. Welcome with user data, sent once per connection
+        welcome = receive_until(ws, "welcome")
+        receive_until(other, "welcome")
+        assert welcome["user_data"]["user_id"] == "1001", welcome
+        print("✅ Welcome received")
+
+        # 5b. Two multiplexed requests; each gets its own chunks and result
+        ws.send(json.dumps({"type": "message", "request_id": "r1", "intent": "log_mood", "message": "I'm feeling happy"}))
+        ws.send(json.dumps({"type": "message", "request_id": "r2", "intent": "general_query", "message": "What is a CGM?"}))
+        streamed = {"r1": "", "r2": ""}
+        results = {}
+        while len(results) < 2:
+            message = json.loads(ws.recv())
+            if message.get("type") == "chunk":
+                streamed[message["request_id"]] += message["delta"]
+            elif message.get("type") == "result":
+                results[message["request_id"]] = message
+            elif message.get("type") == "error":
+                raise AssertionError(f"Server error: {message.get('error')}")
+        for request_id, result in results.items():
+            assert result["agent_response"] == streamed[request_id], request_id
+            assert "<think>" not in result["agent_response"], request_id
+        print("✅ Multiplexed requests streamed and completed")
+
+        # 5c. Heartbeat
+        ws.send(json.dumps({"type": "ping"}))
+        receive_until(ws, "pong")
+        print("✅ Ping/pong working")
+
+        # 5d. Non-object frames get an error reply instead of killing the socket
+        ws.send(json.dumps([1, 2]))
+        message = json.loads(ws.recv())
+        assert message.get("type") == "error", message
+        ws.send_binary(b"\x00\x01")
+        message = json.loads(ws.recv())
+        assert message.get("type") == "error", message
+        print("✅ Malformed frames rejected")
+
+        # 5e. Background result is pushed to every socket of the user
+        ws.send(json.dumps({"type": "message", "request_id": "bg1", "intent": "general_query",
+                            "message": "Any tips for staying hydrated?", "background": True}))
+        receive_until(ws, "result", "bg1")
+        receive_until(other, "result", "bg1")
+        print("✅ Background result pushed to all sockets")
+
+        # 5f. CGM alerts from another channel are pushed
+        requests.post(f"{ws_url.replace('ws', 'http', 1)}/api/run_agent",
+                      json={"user_id": "1001", "intent": "log_cgm", "message": "My glucose reading is 55 mg/dL"},
+                      timeout=30)
+        alert = receive_until(ws, "cgm_alert")
+        assert alert["forecast"]["alert"] == "HYPO", alert
+        print("✅ CGM alert pushed")
+
+        ws.close()
+        other.close()
+
+        # 5g. Invalid user gets an error and close code 4401
+        bad = websocket.create_connection(f"{ws_url}/ws/chat/invalid-user", timeout=10)
+        message = json.loads(bad.recv())
+        assert message.get("type") == "error", message
+        opcode, frame = bad.recv_data_frame(control_frame=True)
+        assert opcode == websocket.ABNF.OPCODE_CLOSE, opcode
+        assert int.from_bytes(frame.data[:2], "big") == 4401, frame.data
+        bad.close()
+        print("✅ Invalid user rejected with 4401")
+        return True
+    except (websocket.WebSocketException, OSError, AssertionError) as e:
+        print(f"❌ WebSocket test failed: {e}")
+        return False
+
 if __name__ == "__main__":
     test_backend()
 
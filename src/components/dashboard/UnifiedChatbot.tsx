@@ -5,6 +5,7 @@ import { Input } from "@/components/ui/input";
 import { ScrollArea } from "@/components/ui/scroll-area";
 import { Send, Bot, User, Loader2 } from "lucide-react";
 import { runAgent } from "@/utils/api";
+import { ChatSocket, type CgmForecast } from "@/utils/chatSocket";
 import { type UserData } from "@/utils/userData";
 
 interface Message {
@@ -38,6 +39,36 @@ How can I help you today?`,
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const scrollRef = useRef<HTMLDivElement>(null);
+  const socketRef = useRef<ChatSocket | null>(null);
+
+  useEffect(() => {
+    const socket = new ChatSocket(userData.user_id, {
+      onAlert: (forecast) => {
+        setMessages((prev) => [
+          ...prev,
+          {
+            id: `alert-${forecast.timestamp}-${prev.length}`,
+            role: "assistant",
+            content: formatAlert(forecast),
+            timestamp: new Date(),
+          },
+        ]);
+      },
+      onBackgroundResult: (requestId, response) => {
+        setMessages((prev) => [
+          ...prev,
+          {
+            id: `bg-${requestId}`,
+            role: "assistant",
+            content: response.agent_response,
+            timestamp: new Date(),
+          },
+        ]);
+      },
+    });
+    socketRef.current = socket;
+    return () => socket.close();
+  }, [userData.user_id]);
 
   useEffect(() => {
     if (scrollRef.current) {
@@ -61,23 +92,40 @@ How can I help you today?`,
 
     try {
       // Determine the appropriate intent based on user input
-      const intent = determineIntent(input.trim());
+      const intent = determineIntent(userMessage.content);
       
-      // Call the appropriate agent
-      const response = await runAgent({
-        user_id: userData.user_id,
-        intent: intent.type,
-        message: input.trim(),
-      });
-
-      const botMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: "assistant",
-        content: response.agent_response,
-        timestamp: new Date(),
-      };
+      const botId = (Date.now() + 1).toString();
+      const socket = socketRef.current;
 
-      setMessages((prev) => [...prev, botMessage]);
+      if (socket?.isOpen) {
+        // Stream the reply into a single assistant message as it arrives
+        setMessages((prev) => [...prev, { id: botId, role: "assistant", content: "", timestamp: new Date() }]);
+        const appendToBot = (delta: string) =>
+          setMessages((prev) =>
+            prev.map((m) => (m.id === botId ? { ...m, content: m.content + delta } : m))
+          );
+
+        const response = await socket.send(intent.type, userMessage.content, appendToBot);
+        setMessages((prev) =>
+          prev.map((m) => (m.id === botId ? { ...m, content: response.agent_response } : m))
+        );
+      } else {
+        // Fall back to a one-off HTTP request while the socket is (re)connecting
+        const response = await runAgent({
+          user_id: userData.user_id,
+          intent: intent.type,
+          message: userMessage.content,
+        });
+
+        const botMessage: Message = {
+          id: botId,
+          role: "assistant",
+          content: response.agent_response,
+          timestamp: new Date(),
+        };
+
+        setMessages((prev) => [...prev, botMessage]);
+      }
     } catch (error) {
       console.error("Error getting AI response:", error);
       const errorMessage: Message = {
@@ -86,12 +134,24 @@ How can I help you today?`,
         content: "I apologize, but I'm having trouble responding right now. Please try again.",
         timestamp: new Date(),
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      // Drop an empty streaming placeholder left behind by a failed socket request
+      setMessages((prev) => [
+        ...prev.filter((m) => m.role !== "assistant" || m.content !== ""),
+        errorMessage,
+      ]);
     } finally {
       setIsLoading(false);
     }
   };
 
+  const formatAlert = (forecast: CgmForecast) => {
+    const predicted = forecast.alert?.startsWith("PREDICTED");
+    const direction = forecast.alert?.endsWith("HYPO") ? "low" : "high";
+    return predicted
+      ? `⚠️ Glucose alert: ${forecast.value} mg/dL now, trending to ${Math.round(forecast.predicted_value)} mg/dL in ${forecast.horizon_minutes} minutes (predicted ${direction}).`
+      : `🚨 Critical glucose alert: ${forecast.value} mg/dL is too ${direction}.`;
+  };
+
   const determineIntent = (input: string) => {
     const lowerInput = input.toLowerCase();
     
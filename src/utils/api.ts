@@ -1,4 +1,4 @@
-const API_BASE_URL = 'http://localhost:8000';
+export const API_BASE_URL = 'http://localhost:8000';
 
 export interface AgentRequest {
   user_id: string;
@@ -9,6 +9,7 @@ export interface AgentRequest {
 export interface AgentResponse {
   agent_response: string;
   user_data?: any;
+  cgm_forecast?: any;
 }
 
 export const runAgent = async (request: AgentRequest): Promise<AgentResponse> => {
@@ -0,0 +1,120 @@
+import { API_BASE_URL, type AgentResponse } from './api';
+
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, 'ws');
+const RECONNECT_DELAY_MS = 2000;
+
+export interface CgmForecast {
+  user_id: string;
+  timestamp: number;
+  value: number;
+  rate_of_change: number;
+  predicted_value: number;
+  horizon_minutes: number;
+  alert: string | null;
+}
+
+interface PendingRequest {
+  onChunk?: (delta: string) => void;
+  resolve: (response: AgentResponse) => void;
+  reject: (error: Error) => void;
+}
+
+export interface ChatSocketHandlers {
+  onAlert?: (forecast: CgmForecast) => void;
+  onBackgroundResult?: (requestId: string, response: AgentResponse) => void;
+  onStatusChange?: (connected: boolean) => void;
+}
+
+/**
+ * Persistent chat channel to the agent backend. The user is validated once per
+ * connection; requests are multiplexed by request_id and their output streamed.
+ */
+export class ChatSocket {
+  private socket: WebSocket | null = null;
+  private pending = new Map<string, PendingRequest>();
+  private nextId = 0;
+  private closed = false;
+  private reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+
+  constructor(private userId: string, private handlers: ChatSocketHandlers = {}) {
+    this.connect();
+  }
+
+  get isOpen(): boolean {
+    return this.socket?.readyState === WebSocket.OPEN;
+  }
+
+  private connect() {
+    this.reconnectTimer = null;
+    if (this.closed) return;
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/chat/${encodeURIComponent(this.userId)}`);
+    this.socket = socket;
+
+    socket.onopen = () => this.handlers.onStatusChange?.(true);
+    socket.onmessage = (event) => this.handleMessage(JSON.parse(event.data));
+    socket.onclose = (event) => {
+      this.handlers.onStatusChange?.(false);
+      this.pending.forEach((request) => request.reject(new Error('Chat connection closed')));
+      this.pending.clear();
+      // 4401 = invalid user; reconnecting would be rejected again
+      if (!this.closed && event.code !== 4401) {
+        this.reconnectTimer = setTimeout(() => this.connect(), RECONNECT_DELAY_MS);
+      }
+    };
+  }
+
+  private handleMessage(message: any) {
+    switch (message.type) {
+      case 'ping':
+        this.socket?.send(JSON.stringify({ type: 'pong' }));
+        break;
+      case 'chunk':
+        this.pending.get(message.request_id)?.onChunk?.(message.delta);
+        break;
+      case 'result': {
+        const { type, request_id, intent, ...response } = message;
+        const request = this.pending.get(request_id);
+        if (request) {
+          this.pending.delete(request_id);
+          request.resolve(response);
+        } else {
+          this.handlers.onBackgroundResult?.(request_id, response);
+        }
+        break;
+      }
+      case 'cgm_alert':
+        this.handlers.onAlert?.(message.forecast);
+        break;
+      case 'error': {
+        const request = this.pending.get(message.request_id);
+        if (request) {
+          this.pending.delete(message.request_id);
+          request.reject(new Error(message.error));
+        } else {
+          console.error('Chat socket error:', message.error);
+        }
+        break;
+      }
+    }
+  }
+
+  send(intent: string, message: string, onChunk?: (delta: string) => void): Promise<AgentResponse> {
+    if (!this.isOpen) {
+      return Promise.reject(new Error('Chat connection is not open'));
+    }
+    const requestId = `${Date.now()}-${this.nextId++}`;
+    return new Promise((resolve, reject) => {
+      this.pending.set(requestId, { onChunk, resolve, reject });
+      this.socket!.send(JSON.stringify({ type: 'message', request_id: requestId, intent, message }));
+    });
+  }
+
+  close() {
+    this.closed = true;
+    if (this.reconnectTimer !== null) {
+      clearTimeout(this.reconnectTimer);
+      this.reconnectTimer = null;
+    }
+    this.socket?.close();
+  }
+}